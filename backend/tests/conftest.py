@@ -5,11 +5,14 @@ This module provides reusable fixtures for mocking dependencies
 and setting up test data across all test modules.
 """
 
+import uuid
+import orjson
+from types import MappingProxyType
 import pytest
-from unittest.mock import Mock, MagicMock
-from typing import List, Dict, Optional
-from fastapi import FastAPI, HTTPException
-from fastapi.testclient import TestClient
+import pytest_asyncio
+from typing import List, Dict, Optional, Tuple
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.responses import ORJSONResponse
 from httpx import AsyncClient, ASGITransport
 from pydantic import BaseModel
 
@@ -47,28 +50,41 @@ class CourseStats(BaseModel):
 # Mock Classes
 # ============================================================================
 
+# Default mock data, built once and shared by every MockRAGSystem.reset()
+_DEFAULT_RESPONSE = "This is a mock response about RAG systems."
+_DEFAULT_SOURCES = (
+    MappingProxyType({"text": "Course A - Lesson 1", "url": "https://example.com/course-a/lesson-1"}),
+    MappingProxyType({"text": "Course A - Lesson 2", "url": None}),
+)
+_DEFAULT_SOURCE_MODELS = tuple(Source(**s) for s in _DEFAULT_SOURCES)
+_DEFAULT_COURSE_STATS = CourseStats(
+    total_courses=3,
+    course_titles=["Course A", "Course B", "Course C"]
+)
+# Encoded default QueryResponse up to (not including) its closing brace
+_DEFAULT_RESPONSE_PREFIX = orjson.dumps({
+    "answer": _DEFAULT_RESPONSE,
+    "sources": [dict(s) for s in _DEFAULT_SOURCES]
+})[:-1]
+
+
 class MockSessionManager:
     """Mock session manager for testing"""
 
     def __init__(self):
         self.sessions: Dict[str, List] = {}
-        self.session_counter = 0
 
     def create_session(self) -> str:
-        self.session_counter += 1
-        session_id = f"test_session_{self.session_counter}"
+        # Random rather than sequential, so ids stay unique across xdist workers
+        session_id = f"test_session_{uuid.uuid4().hex[:8]}"
         self.sessions[session_id] = []
         return session_id
 
     def get_conversation_history(self, session_id: Optional[str]) -> Optional[str]:
-        if not session_id or session_id not in self.sessions:
-            return None
-        return "Mock conversation history"
+        return "Mock conversation history" if session_id and session_id in self.sessions else None
 
     def add_exchange(self, session_id: str, user_message: str, assistant_message: str):
-        if session_id not in self.sessions:
-            self.sessions[session_id] = []
-        self.sessions[session_id].append({
+        self.sessions.setdefault(session_id, []).append({
             "user": user_message,
             "assistant": assistant_message
         })
@@ -79,36 +95,53 @@ class MockRAGSystem:
 
     def __init__(self):
         self.session_manager = MockSessionManager()
-        self._query_response = "This is a mock response about RAG systems."
-        self._query_sources = [
-            {"text": "Course A - Lesson 1", "url": "https://example.com/course-a/lesson-1"},
-            {"text": "Course A - Lesson 2", "url": None}
-        ]
-        self._course_analytics = {
-            "total_courses": 3,
-            "course_titles": ["Course A", "Course B", "Course C"]
-        }
+        self.reset()
+
+    def reset(self):
+        """Restore default responses and clear any per-test state"""
+        self._query_response = _DEFAULT_RESPONSE
+        self._query_sources = _DEFAULT_SOURCES
+        # Copy the models so changes a test makes to them don't outlive it
+        self._query_sources_models = [s.model_copy() for s in _DEFAULT_SOURCE_MODELS]
+        self._course_stats = _DEFAULT_COURSE_STATS.model_copy(deep=True)
         self._should_raise_error = False
         self._error_message = "Mock error"
+        self.session_manager.sessions.clear()
 
-    def query(self, query: str, session_id: Optional[str] = None):
+    def query_models(self, query: str, session_id: Optional[str] = None):
+        """Return the configured answer with sources as prebuilt Source models"""
         if self._should_raise_error:
             raise Exception(self._error_message)
-        return self._query_response, self._query_sources
+        return self._query_response, self._query_sources_models
+
+    async def aquery(self, query: str, session_id: Optional[str] = None):
+        """Async query_models(); never blocks, so it is safe on the event loop"""
+        return self.query_models(query, session_id)
+
+    def uses_default_response(self) -> bool:
+        """Whether the query answer and sources are still the defaults"""
+        return self._query_sources is _DEFAULT_SOURCES and self._query_response == _DEFAULT_RESPONSE
 
-    def get_course_analytics(self) -> Dict:
+    def default_response_template_bytes(self, session_id: str) -> bytes:
+        """Encoded default QueryResponse JSON for the given session"""
+        return _DEFAULT_RESPONSE_PREFIX + b',"session_id":' + orjson.dumps(session_id) + b"}"
+
+    def get_course_analytics(self) -> CourseStats:
+        """Return the configured analytics, already validated as CourseStats"""
         if self._should_raise_error:
             raise Exception(self._error_message)
-        return self._course_analytics
+        return self._course_stats
 
     def set_query_response(self, response: str, sources: List[Dict]):
-        """Configure mock query response for testing"""
-        self._query_response = response
+        """Configure mock query response for testing, validating it against QueryResponse"""
+        validated = QueryResponse(answer=response, sources=sources, session_id="")
+        self._query_response = validated.answer
         self._query_sources = sources
+        self._query_sources_models = validated.sources
 
     def set_course_analytics(self, analytics: Dict):
-        """Configure mock course analytics for testing"""
-        self._course_analytics = analytics
+        """Configure mock course analytics for testing, validating them against CourseStats"""
+        self._course_stats = CourseStats(**analytics)
 
     def set_error(self, should_raise: bool, message: str = "Mock error"):
         """Configure mock to raise errors"""
@@ -120,6 +153,10 @@ class MockRAGSystem:
 # Test App Factory
 # ============================================================================
 
+# The health payload never changes, so encode it once
+_HEALTH_BYTES = orjson.dumps({"message": "RAG System API", "status": "healthy"})
+
+
 def create_test_app(rag_system: MockRAGSystem) -> FastAPI:
     """
     Create a test FastAPI app with mocked dependencies.
@@ -127,7 +164,7 @@ def create_test_app(rag_system: MockRAGSystem) -> FastAPI:
     This avoids importing the main app.py which mounts static files
     that don't exist in the test environment.
     """
-    app = FastAPI(title="Test RAG System")
+    app = FastAPI(title="Test RAG System", default_response_class=ORJSONResponse)
 
     @app.post("/api/query", response_model=QueryResponse)
     async def query_documents(request: QueryRequest):
@@ -137,10 +174,21 @@ def create_test_app(rag_system: MockRAGSystem) -> FastAPI:
             if not session_id:
                 session_id = rag_system.session_manager.create_session()
 
-            answer, sources_list = rag_system.query(request.query, session_id)
-            sources = [Source(**s) for s in sources_list] if sources_list else []
-
-            return QueryResponse(
+            # Raises the configured error, if any. A blocking RAG system would
+            # need to go through run_in_threadpool here instead.
+            result = await rag_system.aquery(request.query, session_id)
+
+            if rag_system.uses_default_response():
+                # Serve the pre-encoded default response, skipping model validation
+                return Response(
+                    content=rag_system.default_response_template_bytes(session_id),
+                    media_type="application/json"
+                )
+
+            # Answer and sources were validated when the mock was configured and
+            # session_id is already a str, so construct without revalidating
+            answer, sources = result
+            return QueryResponse.model_construct(
                 answer=answer,
                 sources=sources,
                 session_id=session_id
@@ -152,47 +200,98 @@ def create_test_app(rag_system: MockRAGSystem) -> FastAPI:
     async def get_course_stats():
         """Get course analytics and statistics"""
         try:
-            analytics = rag_system.get_course_analytics()
-            return CourseStats(
-                total_courses=analytics["total_courses"],
-                course_titles=analytics["course_titles"]
-            )
+            # Validated as CourseStats when the mock was configured
+            return rag_system.get_course_analytics()
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
 
-    @app.get("/")
+    @app.get("/", include_in_schema=False)
     async def root():
         """Root endpoint - in production serves static files"""
-        return {"message": "RAG System API", "status": "healthy"}
+        return Response(content=_HEALTH_BYTES, media_type="application/json")
 
     return app
 
 
+async def call_asgi(
+    app: FastAPI,
+    method: str,
+    path: str,
+    body: bytes = b"",
+    headers: Optional[Dict[str, str]] = None
+) -> Tuple[int, bytes]:
+    """
+    Drive an ASGI app directly with a single HTTP request.
+
+    Returns the response status code and body without going through
+    an HTTP client.
+    """
+    raw_headers = [
+        (name.lower().encode(), value.encode())
+        for name, value in (headers or {}).items()
+    ]
+    if not any(name == b"content-length" for name, _ in raw_headers):
+        raw_headers.append((b"content-length", str(len(body)).encode()))
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": raw_headers,
+        "client": ("testclient", 50000),
+        "server": ("test", 80),
+    }
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+
+    start = next((m for m in sent if m["type"] == "http.response.start"), None)
+    assert start is not None, f"{method} {path} completed without sending http.response.start"
+    status = start["status"]
+    response_body = b"".join(m.get("body", b"") for m in sent if m["type"] == "http.response.body")
+    return status, response_body
+
+
 # ============================================================================
 # Fixtures
 # ============================================================================
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def mock_rag_system() -> MockRAGSystem:
-    """Provide a fresh mock RAG system for each test"""
+    """Provide a mock RAG system shared across the test session"""
     return MockRAGSystem()
 
 
-@pytest.fixture
+@pytest.fixture(autouse=True)
+def _reset_mock(mock_rag_system: MockRAGSystem):
+    """Reset the shared mock RAG system before each test"""
+    mock_rag_system.reset()
+
+
+@pytest.fixture(scope="session")
 def test_app(mock_rag_system: MockRAGSystem) -> FastAPI:
     """Provide a test FastAPI app with mocked dependencies"""
     return create_test_app(mock_rag_system)
 
 
-@pytest.fixture
-def client(test_app: FastAPI) -> TestClient:
-    """Provide a synchronous test client"""
-    return TestClient(test_app)
-
-
-@pytest.fixture
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
 async def async_client(test_app: FastAPI) -> AsyncClient:
-    """Provide an async test client for async tests"""
+    """Provide an async test client shared across the test session"""
+    # ASGITransport calls the app in-process, so there is no connection pool:
+    # httpx only applies limits= and http2= to its default network transport.
     transport = ASGITransport(app=test_app)
     async with AsyncClient(transport=transport, base_url="http://test") as ac:
         yield ac
@@ -7,42 +7,94 @@ Tests cover:
 - GET / - Root endpoint (health check in test mode)
 """
 
+import asyncio
+
+import orjson
 import pytest
-from fastapi.testclient import TestClient
+from fastapi import FastAPI
 from httpx import AsyncClient
-
-from conftest import MockRAGSystem, create_test_app
+from pydantic import ValidationError
+
+from conftest import MockRAGSystem, QueryResponse, call_asgi
+
+
+JSON_HEADERS = {"content-type": "application/json"}
+MAX_CONCURRENT_QUERIES = 50
+
+
+# ============================================================================
+# Pre-encoded Request Bodies
+# ============================================================================
+
+# Valid query bodies that must all succeed, with the response fields they expect
+QUERY_VARIANTS = [
+    pytest.param(
+        orjson.dumps({"query": "What is RAG?"}),
+        {"answer": "This is a mock response about RAG systems."},
+        id="without_session"
+    ),
+    pytest.param(
+        orjson.dumps({"query": "Tell me more", "session_id": "existing_session"}),
+        {"session_id": "existing_session"},
+        id="with_session"
+    ),
+    pytest.param(
+        orjson.dumps({"query": "What is " + "very " * 100 + "important about RAG?"}),
+        {},
+        id="long_text"
+    ),
+    pytest.param(
+        orjson.dumps({"query": "What about <script>alert('xss')</script> and SQL' OR '1'='1?"}),
+        {},
+        id="special_characters"
+    ),
+    pytest.param(
+        orjson.dumps({"query": "Test", "session_id": None}),
+        {},
+        id="null_session_id"
+    ),
+    pytest.param(
+        orjson.dumps({
+            "query": "Valid query",
+            "extra_field": "should be ignored",
+            "another_extra": 123
+        }),
+        {},
+        id="extra_fields_ignored"
+    ),
+    # Empty string is technically valid per the schema
+    pytest.param(orjson.dumps({"query": ""}), {}, id="empty_query_string"),
+]
+
+
+# JSON bodies for the concurrent query test
+CONCURRENT_QUERIES = tuple(
+    orjson.dumps({"query": f"Question {i}"}) for i in range(MAX_CONCURRENT_QUERIES)
+)
 
 
 class TestQueryEndpoint:
     """Tests for POST /api/query endpoint"""
 
-    def test_query_success_without_session(self, client: TestClient, mock_rag_system: MockRAGSystem):
-        """Test successful query without providing session_id"""
-        response = client.post("/api/query", json={"query": "What is RAG?"})
+    @pytest.mark.parametrize("encoded_body,expected", QUERY_VARIANTS)
+    async def test_query_variants(self, async_client: AsyncClient, encoded_body: bytes, expected: dict):
+        """Test that valid query bodies succeed with the expected fields"""
+        response = await async_client.post("/api/query", content=encoded_body, headers=JSON_HEADERS)
 
         assert response.status_code == 200
         data = response.json()
         assert "answer" in data
         assert "sources" in data
         assert "session_id" in data
-        assert data["session_id"].startswith("test_session_")
-        assert data["answer"] == "This is a mock response about RAG systems."
-
-    def test_query_success_with_session(self, client: TestClient, mock_rag_system: MockRAGSystem):
-        """Test successful query with existing session_id"""
-        response = client.post(
-            "/api/query",
-            json={"query": "Tell me more", "session_id": "existing_session"}
-        )
-
-        assert response.status_code == 200
-        data = response.json()
-        assert data["session_id"] == "existing_session"
+        if "session_id" not in expected:
+            # A new session is created when none is provided
+            assert data["session_id"].startswith("test_session_")
+        for field, value in expected.items():
+            assert data[field] == value
 
-    def test_query_returns_sources(self, client: TestClient, mock_rag_system: MockRAGSystem):
+    async def test_query_returns_sources(self, async_client: AsyncClient, mock_rag_system: MockRAGSystem):
         """Test that query returns properly formatted sources"""
-        response = client.post("/api/query", json={"query": "What courses exist?"})
+        response = await async_client.post("/api/query", json={"query": "What courses exist?"})
 
         assert response.status_code == 200
         data = response.json()
@@ -53,18 +105,14 @@ class TestQueryEndpoint:
         assert sources[1]["text"] == "Course A - Lesson 2"
         assert sources[1]["url"] is None
 
-    def test_query_with_custom_response(self, client: TestClient, mock_rag_system: MockRAGSystem):
+    async def test_query_with_custom_response(self, async_client: AsyncClient, mock_rag_system: MockRAGSystem):
         """Test query with configured mock response"""
         mock_rag_system.set_query_response(
             response="Custom test response",
             sources=[{"text": "Custom Source", "url": "https://custom.url"}]
         )
 
-        # Need to recreate app with updated mock
-        app = create_test_app(mock_rag_system)
-        client = TestClient(app)
-
-        response = client.post("/api/query", json={"query": "Test query"})
+        response = await async_client.post("/api/query", json={"query": "Test query"})
 
         assert response.status_code == 200
         data = response.json()
@@ -72,69 +120,55 @@ class TestQueryEndpoint:
         assert len(data["sources"]) == 1
         assert data["sources"][0]["text"] == "Custom Source"
 
-    def test_query_empty_sources(self, client: TestClient, mock_rag_system: MockRAGSystem):
+    async def test_query_empty_sources(self, async_client: AsyncClient, mock_rag_system: MockRAGSystem):
         """Test query when no sources are returned"""
         mock_rag_system.set_query_response(
             response="Response without sources",
             sources=[]
         )
-        app = create_test_app(mock_rag_system)
-        client = TestClient(app)
 
-        response = client.post("/api/query", json={"query": "General question"})
+        response = await async_client.post("/api/query", json={"query": "General question"})
 
         assert response.status_code == 200
         data = response.json()
         assert data["sources"] == []
 
-    def test_query_missing_query_field(self, client: TestClient):
+    async def test_query_missing_query_field(self, async_client: AsyncClient):
         """Test query with missing required field"""
-        response = client.post("/api/query", json={})
+        response = await async_client.post("/api/query", json={})
 
         assert response.status_code == 422  # Validation error
 
-    def test_query_empty_query_string(self, client: TestClient):
-        """Test query with empty string"""
-        response = client.post("/api/query", json={"query": ""})
-
-        # Empty string is technically valid per the schema
-        assert response.status_code == 200
-
-    def test_query_internal_error(self, client: TestClient, mock_rag_system: MockRAGSystem):
+    async def test_query_internal_error(self, async_client: AsyncClient, mock_rag_system: MockRAGSystem):
         """Test query endpoint error handling"""
         mock_rag_system.set_error(True, "Database connection failed")
-        app = create_test_app(mock_rag_system)
-        client = TestClient(app)
 
-        response = client.post("/api/query", json={"query": "This will fail"})
+        response = await async_client.post("/api/query", json={"query": "This will fail"})
 
         assert response.status_code == 500
         assert "Database connection failed" in response.json()["detail"]
 
-    def test_query_long_text(self, client: TestClient, mock_rag_system: MockRAGSystem):
-        """Test query with long text input"""
-        long_query = "What is " + "very " * 100 + "important about RAG?"
-
-        response = client.post("/api/query", json={"query": long_query})
-
-        assert response.status_code == 200
-
-    def test_query_special_characters(self, client: TestClient, mock_rag_system: MockRAGSystem):
-        """Test query with special characters"""
-        response = client.post(
-            "/api/query",
-            json={"query": "What about <script>alert('xss')</script> and SQL' OR '1'='1?"}
-        )
-
-        assert response.status_code == 200
+    @pytest.mark.parametrize("response,sources", [
+        pytest.param(123, [{"text": "Valid Source", "url": None}], id="invalid_answer"),
+        pytest.param("Valid answer", [{"url": None}], id="invalid_sources"),
+    ])
+    def test_query_response_must_match_schema(
+        self,
+        mock_rag_system: MockRAGSystem,
+        response,
+        sources: list
+    ):
+        """Test that a mock response not matching QueryResponse is rejected"""
+        with pytest.raises(ValidationError):
+            mock_rag_system.set_query_response(response=response, sources=sources)
 
 
 class TestCoursesEndpoint:
     """Tests for GET /api/courses endpoint"""
 
-    def test_get_courses_success(self, client: TestClient):
+    async def test_get_courses_success(self, async_client: AsyncClient):
         """Test successful course statistics retrieval"""
-        response = client.get("/api/courses")
+        response = await async_client.get("/api/courses")
 
         assert response.status_code == 200
         data = response.json()
@@ -143,9 +177,9 @@ class TestCoursesEndpoint:
         assert data["total_courses"] == 3
         assert len(data["course_titles"]) == 3
 
-    def test_get_courses_returns_titles(self, client: TestClient):
+    async def test_get_courses_returns_titles(self, async_client: AsyncClient):
         """Test that course titles are returned correctly"""
-        response = client.get("/api/courses")
+        response = await async_client.get("/api/courses")
 
         assert response.status_code == 200
         data = response.json()
@@ -153,56 +187,86 @@ class TestCoursesEndpoint:
         assert "Course B" in data["course_titles"]
         assert "Course C" in data["course_titles"]
 
-    def test_get_courses_custom_analytics(self, mock_rag_system: MockRAGSystem):
+    async def test_get_courses_custom_analytics(self, async_client: AsyncClient, mock_rag_system: MockRAGSystem):
         """Test with custom course analytics"""
         mock_rag_system.set_course_analytics({
             "total_courses": 5,
             "course_titles": ["Alpha", "Beta", "Gamma", "Delta", "Epsilon"]
         })
-        app = create_test_app(mock_rag_system)
-        client = TestClient(app)
 
-        response = client.get("/api/courses")
+        response = await async_client.get("/api/courses")
 
         assert response.status_code == 200
         data = response.json()
         assert data["total_courses"] == 5
         assert "Alpha" in data["course_titles"]
 
-    def test_get_courses_empty(self, mock_rag_system: MockRAGSystem):
+    async def test_get_courses_empty(self, async_client: AsyncClient, mock_rag_system: MockRAGSystem):
         """Test when no courses exist"""
         mock_rag_system.set_course_analytics({
             "total_courses": 0,
             "course_titles": []
         })
-        app = create_test_app(mock_rag_system)
-        client = TestClient(app)
 
-        response = client.get("/api/courses")
+        response = await async_client.get("/api/courses")
 
         assert response.status_code == 200
         data = response.json()
         assert data["total_courses"] == 0
         assert data["course_titles"] == []
 
-    def test_get_courses_internal_error(self, mock_rag_system: MockRAGSystem):
+    async def test_get_courses_internal_error(self, async_client: AsyncClient, mock_rag_system: MockRAGSystem):
         """Test courses endpoint error handling"""
         mock_rag_system.set_error(True, "Vector store unavailable")
-        app = create_test_app(mock_rag_system)
-        client = TestClient(app)
 
-        response = client.get("/api/courses")
+        response = await async_client.get("/api/courses")
 
         assert response.status_code == 500
         assert "Vector store unavailable" in response.json()["detail"]
 
+    @pytest.mark.parametrize("analytics", [
+        pytest.param({"total_courses": "not-an-int", "course_titles": ["A"]}, id="invalid_total"),
+        pytest.param({"total_courses": 2, "course_titles": [1, 2]}, id="invalid_titles"),
+    ])
+    def test_course_analytics_must_match_schema(self, mock_rag_system: MockRAGSystem, analytics: dict):
+        """Test that mock analytics not matching CourseStats are rejected"""
+        with pytest.raises(ValidationError):
+            mock_rag_system.set_course_analytics(analytics)
+
+
+class TestMockRAGSystem:
+    """Tests for the shared mock RAG system's per-test reset"""
+
+    def test_reset_restores_mutated_course_analytics(self, mock_rag_system: MockRAGSystem):
+        """Test that reset() undoes changes made to the returned course analytics"""
+        stats = mock_rag_system.get_course_analytics()
+        stats.total_courses = 99
+        stats.course_titles.append("Leaked")
+
+        mock_rag_system.reset()
+
+        stats = mock_rag_system.get_course_analytics()
+        assert stats.total_courses == 3
+        assert stats.course_titles == ["Course A", "Course B", "Course C"]
+
+    def test_reset_restores_mutated_sources(self, mock_rag_system: MockRAGSystem):
+        """Test that reset() undoes changes made to the returned source models"""
+        _, sources = mock_rag_system.query_models("Test")
+        sources[0].text = "Leaked"
+        sources.append(sources[1])
+
+        mock_rag_system.reset()
+
+        _, sources = mock_rag_system.query_models("Test")
+        assert [s.text for s in sources] == ["Course A - Lesson 1", "Course A - Lesson 2"]
+
 
 class TestRootEndpoint:
     """Tests for GET / endpoint"""
 
-    def test_root_returns_health_status(self, client: TestClient):
+    async def test_root_returns_health_status(self, async_client: AsyncClient):
         """Test root endpoint returns health status"""
-        response = client.get("/")
+        response = await async_client.get("/")
 
         assert response.status_code == 200
         data = response.json()
@@ -213,7 +277,6 @@ class TestRootEndpoint:
 class TestAsyncEndpoints:
     """Async tests for API endpoints using httpx AsyncClient"""
 
-    @pytest.mark.asyncio
     async def test_async_query(self, async_client: AsyncClient):
         """Test query endpoint with async client"""
         response = await async_client.post(
@@ -225,7 +288,6 @@ class TestAsyncEndpoints:
         data = response.json()
         assert "answer" in data
 
-    @pytest.mark.asyncio
     async def test_async_courses(self, async_client: AsyncClient):
         """Test courses endpoint with async client"""
         response = await async_client.get("/api/courses")
@@ -234,29 +296,23 @@ class TestAsyncEndpoints:
         data = response.json()
         assert "total_courses" in data
 
-    @pytest.mark.asyncio
     async def test_async_root(self, async_client: AsyncClient):
         """Test root endpoint with async client"""
         response = await async_client.get("/")
 
         assert response.status_code == 200
 
-    @pytest.mark.asyncio
-    async def test_async_concurrent_queries(self, async_client: AsyncClient):
+    @pytest.mark.parametrize("num_queries", [5, MAX_CONCURRENT_QUERIES])
+    async def test_async_concurrent_queries(self, async_client: AsyncClient, num_queries: int):
         """Test multiple concurrent queries"""
-        import asyncio
-
-        queries = [
-            {"query": f"Question {i}"} for i in range(5)
-        ]
-
         tasks = [
-            async_client.post("/api/query", json=q)
-            for q in queries
+            async_client.post("/api/query", content=body, headers=JSON_HEADERS)
+            for body in CONCURRENT_QUERIES[:num_queries]
         ]
 
         responses = await asyncio.gather(*tasks)
 
+        assert len(responses) == num_queries
         for response in responses:
             assert response.status_code == 200
             assert "answer" in response.json()
@@ -265,57 +321,37 @@ class TestAsyncEndpoints:
 class TestRequestValidation:
     """Tests for request validation and edge cases"""
 
-    def test_invalid_json(self, client: TestClient):
+    async def test_invalid_json(self, test_app: FastAPI):
         """Test with invalid JSON payload"""
-        response = client.post(
+        status, _ = await call_asgi(
+            test_app,
+            "POST",
             "/api/query",
-            content="not valid json",
+            body=b"not valid json",
             headers={"Content-Type": "application/json"}
         )
 
-        assert response.status_code == 422
+        assert status == 422
 
-    def test_wrong_content_type(self, client: TestClient):
+    async def test_wrong_content_type(self, test_app: FastAPI):
         """Test with wrong content type"""
-        response = client.post(
+        status, _ = await call_asgi(
+            test_app,
+            "POST",
             "/api/query",
-            data="query=test",
+            body=b"query=test",
             headers={"Content-Type": "application/x-www-form-urlencoded"}
         )
 
-        assert response.status_code == 422
-
-    def test_extra_fields_ignored(self, client: TestClient):
-        """Test that extra fields in request are ignored"""
-        response = client.post(
-            "/api/query",
-            json={
-                "query": "Valid query",
-                "extra_field": "should be ignored",
-                "another_extra": 123
-            }
-        )
-
-        assert response.status_code == 200
-
-    def test_null_session_id(self, client: TestClient):
-        """Test with explicit null session_id"""
-        response = client.post(
-            "/api/query",
-            json={"query": "Test", "session_id": None}
-        )
-
-        assert response.status_code == 200
-        data = response.json()
-        assert data["session_id"].startswith("test_session_")
+        assert status == 422
 
 
 class TestResponseFormat:
     """Tests for response format and structure"""
 
-    def test_query_response_structure(self, client: TestClient):
+    async def test_query_response_structure(self, async_client: AsyncClient):
         """Test that query response has correct structure"""
-        response = client.post("/api/query", json={"query": "Test"})
+        response = await async_client.post("/api/query", json={"query": "Test"})
 
         data = response.json()
 
@@ -329,9 +365,9 @@ class TestResponseFormat:
         assert isinstance(data["sources"], list)
         assert isinstance(data["session_id"], str)
 
-    def test_courses_response_structure(self, client: TestClient):
+    async def test_courses_response_structure(self, async_client: AsyncClient):
         """Test that courses response has correct structure"""
-        response = client.get("/api/courses")
+        response = await async_client.get("/api/courses")
 
         data = response.json()
 
@@ -343,9 +379,24 @@ class TestResponseFormat:
         assert isinstance(data["total_courses"], int)
         assert isinstance(data["course_titles"], list)
 
-    def test_source_structure(self, client: TestClient):
+    @pytest.mark.parametrize("session_id", ["test_session_abc", 'quote"and\\backslash'])
+    def test_default_response_bytes_match_model(self, mock_rag_system: MockRAGSystem, session_id: str):
+        """Test that the pre-encoded default response matches QueryResponse"""
+        assert mock_rag_system.uses_default_response()
+        answer, sources = mock_rag_system.query_models("Test", session_id)
+        expected = QueryResponse(
+            answer=answer,
+            sources=[s.model_dump() for s in sources],
+            session_id=session_id
+        ).model_dump()
+
+        encoded = mock_rag_system.default_response_template_bytes(session_id)
+
+        assert orjson.loads(encoded) == expected
+
+    async def test_source_structure(self, async_client: AsyncClient):
         """Test that source objects have correct structure"""
-        response = client.post("/api/query", json={"query": "Test"})
+        response = await async_client.post("/api/query", json={"query": "Test"})
 
         data = response.json()
         sources = data["sources"]